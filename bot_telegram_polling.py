@@ -6,19 +6,22 @@ Telegram Bot for Client Data Management - Cloud Run Version
 import os
 import logging
 import asyncio
+import atexit
+import queue
 import subprocess
 import sys
 import json
 import sqlite3
 import time
 import hashlib
+import random
 import threading
 from concurrent.futures import ThreadPoolExecutor
-import pytz
 import re
 from typing import Dict, Any, Optional, List, Tuple
 from collections import OrderedDict
 from datetime import datetime, date
+from zoneinfo import ZoneInfo
 from html import escape as html_escape
 
 # Load environment variables
@@ -29,19 +32,58 @@ except ImportError:
     pass
 
 # Telegram imports
-from telegram import Update, Chat, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, Chat, InlineKeyboardButton, InlineKeyboardMarkup, MessageEntity
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 import telegram
 
 # Google Sheets imports
+import httplib2
+import google_auth_httplib2
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 
 # Configuration
-MEXICO_CITY_TZ = pytz.timezone("America/Mexico_City")
+MEXICO_CITY_TZ = ZoneInfo("America/Mexico_City")
 logger = logging.getLogger(__name__)
 
+# Hot-path lookup tables, built once at import instead of per update.
+# FIELD_MAPPINGS keys are already lowercased/stripped header names.
+FIELD_MAPPINGS = {
+    'client phone number': 'Número 📞',
+    'cliente': 'Cliente 🙋🏻‍♀️',
+    'correo': 'Correo ✉️',
+    'other info': 'Otra Información ℹ️'
+}
+# One compiled alternation beats an any()-over-keywords loop per header cell
+_CLIENT_COL_RE = re.compile(r'client|number|id|code', re.IGNORECASE)
+# Compiled once: stripping non-digits via regex runs in C in a single pass,
+# unlike the per-character filter/genexpr idiom.
+_NON_DIGITS_RE = re.compile(r'\D+')
+# A standalone phone-number-looking message (digits plus common separators)
+_DIRECT_NUMBER_RE = re.compile(r'^[\d\s\-\(\)\+]+$')
+# Static command replies, built once instead of per invocation
+START_GROUP_MESSAGE = (
+    "👋 ¡Hola a todos! Soy <b>Client Data Bot</b>.\n\n"
+    "Para buscar un cliente en este grupo, mencióname o responde a uno de mis mensajes.\n"
+    "Ejemplo: @mi_bot_username 12345"
+)
+HELP_MESSAGE = (
+    "📖 <b>Ayuda de Client Data Bot</b>\n\n"
+    "<b>Buscar clientes:</b>\n"
+    "• <b>En chat privado:</b> Simplemente envía el número de cliente.\n"
+    "• <b>En grupos:</b> Menciona al bot (ej. <code>@username_del_bot 12345</code>) o responde a un mensaje del bot con el número.\n\n"
+    "<b>Comandos disponibles:</b>\n"
+    "• <code>/start</code> - Mensaje de bienvenida.\n"
+    "• <code>/help</code> - Muestra esta ayuda.\n"
+    "• <code>/info</code> - Muestra información sobre la base de datos.\n"
+    "• <code>/status</code> - Verifica el estado del bot y la conexión.\n"
+    "• <code>/whoami</code> - Muestra tu información de Telegram.\n"
+    "• <code>/stats</code> - Muestra estadísticas de uso (autorizado).\n"
+    "• <code>/plogs</code> - Muestra los últimos logs de actividad (autorizado)."
+)
+
 def setup_logging():
     # Allow enabling DEBUG via environment variable DEBUG=1 or DEBUG=true
     log_level = logging.INFO
@@ -80,16 +122,49 @@ def safe_html(text: Optional[str]) -> str:
         return ''
     return html_escape(str(text))
 
+# Secret Manager caching: one client per process and a TTL'd value cache so
+# restarts of dependent components don't re-pay the ~100-500ms RPC per secret.
+_SECRET_CACHE: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+_SECRET_CACHE_TTL = int(os.getenv('SECRET_CACHE_TTL_SECONDS', '3600'))
+_secret_lock = threading.Lock()
+_secret_client = None
+
+
+def _now_str() -> str:
+    """Current Mexico City timestamp in the log format used across the bot."""
+    return datetime.now(MEXICO_CITY_TZ).strftime('%Y-%m-%d %H:%M:%S')
+
+
 def get_secret(project_id: str, secret_id: str, version_id: str = "latest") -> Optional[str]:
     """
     Retrieves a secret from Google Cloud Secret Manager.
+
+    Values are cached per (project, secret, version) for
+    SECRET_CACHE_TTL_SECONDS; the RPC itself runs outside the lock.
     """
+    global _secret_client
+    cache_key = (project_id, secret_id, version_id)
+    now = time.monotonic()
+    with _secret_lock:
+        cached = _SECRET_CACHE.get(cache_key)
+        if cached and now - cached[1] < _SECRET_CACHE_TTL:
+            return cached[0]
+        if _secret_client is None:
+            try:
+                from google.cloud import secretmanager
+                _secret_client = secretmanager.SecretManagerServiceClient()
+            except Exception as e:
+                logger.error(f"❌ Failed to create Secret Manager client: {e}")
+                return None
+        client = _secret_client
+
     try:
-        from google.cloud import secretmanager
-        client = secretmanager.SecretManagerServiceClient()
         name = f"projects/{project_id}/secrets/{secret_id}/versions/{version_id}"
         response = client.access_secret_version(request={"name": name})
-        return response.payload.data.decode("UTF-8")
+        value = response.payload.data.decode("UTF-8")
+        with _secret_lock:
+            _SECRET_CACHE[cache_key] = (value, now)
+        return value
     except Exception as e:
         logger.error(f"❌ Failed to retrieve secret '{secret_id}': {e}")
         return None
@@ -119,6 +194,73 @@ def build_sheets_credentials_from_env() -> Optional[Credentials]:
     return None
 
 
+# Shared Google Sheets service: built once per process and reused by both
+# PersistentLogger and GoogleSheetsManager. Rebuilding per component pays the
+# Secret Manager fetch, service-account parse and discovery build twice.
+_sheets_service_lock = threading.Lock()
+_sheets_service = None
+# httplib2.Http is not thread-safe, so each thread that executes Sheets
+# requests gets its own authorized transport and reuses its keep-alive
+# sockets afterwards instead of paying a TLS handshake per call.
+_thread_http = threading.local()
+
+
+def _make_request_builder(creds):
+    timeout = int(os.getenv('SHEETS_HTTP_TIMEOUT', '30'))
+
+    def _request_builder(_http, *args, **kwargs):
+        authed_http = getattr(_thread_http, 'authed_http', None)
+        if authed_http is None:
+            authed_http = google_auth_httplib2.AuthorizedHttp(
+                creds, http=httplib2.Http(timeout=timeout)
+            )
+            _thread_http.authed_http = authed_http
+        return HttpRequest(authed_http, *args, **kwargs)
+
+    return _request_builder
+
+
+def get_shared_sheets_service():
+    """Return the process-wide Sheets service, building it on first use."""
+    global _sheets_service
+    with _sheets_service_lock:
+        if _sheets_service is not None:
+            return _sheets_service
+
+        creds = None
+        project_id = os.getenv('GCP_PROJECT_ID')
+        if project_id:
+            credentials_json = get_secret(project_id, 'google-credentials-json')
+            if credentials_json:
+                try:
+                    logger.info("Using Google Sheets credentials from Secret Manager")
+                    credentials_data = json.loads(credentials_json)
+                    creds = Credentials.from_service_account_info(
+                        credentials_data,
+                        scopes=['https://www.googleapis.com/auth/spreadsheets']
+                    )
+                except json.JSONDecodeError:
+                    logger.warning("⚠️ Invalid JSON in 'google-credentials-json' secret")
+
+        # VPS/local fallback path
+        if not creds:
+            creds = build_sheets_credentials_from_env()
+        if not creds:
+            return None
+
+        # Disable discovery cache to avoid noisy logs in server environments
+        _sheets_service = build(
+            'sheets', 'v4',
+            credentials=creds,
+            requestBuilder=_make_request_builder(creds),
+            cache_discovery=False,
+            # Build from the discovery doc bundled with the client library
+            # instead of fetching it over HTTPS on cold start.
+            static_discovery=True
+        )
+        return _sheets_service
+
+
 class SQLiteClientStore:
     """Local persistent cache for fast indexed client lookups on the VPS.
 
@@ -345,38 +487,173 @@ class PersistentLogger:
         self.logs_sheet_id = os.getenv('LOGS_SPREADSHEET_ID')
         self.service = None
         self._setup_sheets_service()
-    
+        # Callers check this to skip all marshaling work when logging is off
+        self.enabled = bool(self.service and self.logs_sheet_id)
+        # Batched writer: handlers enqueue rows, a single daemon thread flushes
+        # them as one values().append call instead of one HTTP POST per event.
+        # The queue is bounded so a slow or down Sheets backend sheds log rows
+        # instead of growing memory; drops are counted and reported on recovery.
+        self._log_queue: queue.Queue = queue.Queue(
+            maxsize=int(os.getenv('LOG_QUEUE_MAX', '20000'))
+        )
+        self._dropped_rows = 0
+        self._flush_batch_size = int(os.getenv('LOG_FLUSH_BATCH_SIZE', '50'))
+        self._flush_interval = float(os.getenv('LOG_FLUSH_INTERVAL_SECONDS', '2'))
+        if self.enabled:
+            self._flush_thread = threading.Thread(target=self._flush_worker, daemon=True)
+            self._flush_thread.start()
+            atexit.register(self._flush_pending)
+        # Short-lived memo of the fetched log rows so bursts of /plogs don't
+        # each re-download the sheet; flushed batches are appended in place.
+        self._recent_logs_lock = threading.Lock()
+        self._recent_logs_rows: Optional[List[List[str]]] = None
+        self._recent_logs_ts = 0.0
+        self._recent_logs_ttl = int(os.getenv('PLOGS_CACHE_TTL_SECONDS', '30'))
+        # Total sheet rows (header included), learned lazily and bumped per
+        # flushed batch so tail reads can use a bounded range.
+        self._log_row_count: Optional[int] = None
+        # Running usage counters: seeded from the sheet once, then updated as
+        # rows are enqueued so /stats never re-downloads the whole log sheet.
+        self._stats_lock = threading.Lock()
+        self._stats_seeded = False
+        self._stats_day = date.today().strftime('%Y-%m-%d')
+        self._stats = self._blank_stats()
+
+    @staticmethod
+    def _blank_stats() -> Dict[str, Any]:
+        return {
+            'total_logs': 0,
+            'today_logs': 0,
+            'total_searches': 0,
+            'successful_searches': 0,
+            'failed_searches': 0,
+            'users_today': set(),
+            'groups_today': set(),
+        }
+
+    def _roll_stats_day_locked(self, today: str):
+        """Reset the per-day buckets when the date rolls over (lock held)."""
+        if today != self._stats_day:
+            self._stats_day = today
+            self._stats['today_logs'] = 0
+            self._stats['users_today'] = set()
+            self._stats['groups_today'] = set()
+
+    def _count_log_row_locked(self, row: List[str], today: str):
+        """Fold one log row into the running counters (lock held)."""
+        self._stats['total_logs'] += 1
+        if len(row) < 5:  # Minimum required columns
+            return
+        timestamp = row[0]
+        user_id = row[2] if len(row) > 2 else ""
+        action = row[4] if len(row) > 4 else ""
+        chat_type = row[6] if len(row) > 6 else ""
+        outcome = row[8] if len(row) > 8 else ""
+
+        # Timestamps always start with YYYY-MM-DD, so a prefix check beats
+        # a substring scan over the whole cell.
+        if timestamp.startswith(today):
+            self._stats['today_logs'] += 1
+            if user_id:
+                self._stats['users_today'].add(user_id)
+            if "Group" in chat_type:
+                self._stats['groups_today'].add(chat_type)
+
+        if "SEARCH" in action:
+            self._stats['total_searches'] += 1
+            if outcome == "SUCCESS":
+                self._stats['successful_searches'] += 1
+            elif outcome == "FAILURE":
+                self._stats['failed_searches'] += 1
+
+    def _seed_stats_from_sheet(self):
+        """One-time full scan of the log sheet to seed the running counters."""
+        result = self.service.spreadsheets().values().get(
+            spreadsheetId=self.logs_sheet_id,
+            range='Sheet1!A:I'
+        ).execute()
+        values = result.get('values', [])
+        data_rows = values[1:] if len(values) > 1 else []  # Skip header
+        today = date.today().strftime('%Y-%m-%d')
+        with self._stats_lock:
+            self._stats = self._blank_stats()
+            self._stats_day = today
+            for row in data_rows:
+                self._count_log_row_locked(row, today)
+            self._stats_seeded = True
+        # The seed scan saw the whole sheet; reuse that for tail reads
+        with self._recent_logs_lock:
+            self._log_row_count = len(values)
+
+    def _append_rows(self, rows: List[List[str]]) -> bool:
+        """Write a batch of log rows to Sheets in a single append call."""
+        if not rows or not self.service or not self.logs_sheet_id:
+            return False
+        try:
+            self.service.spreadsheets().values().append(
+                spreadsheetId=self.logs_sheet_id,
+                range='Sheet1!A:I',
+                valueInputOption='RAW',
+                insertDataOption='INSERT_ROWS',
+                body={'values': rows}
+            ).execute()
+            # Keep the /plogs memo current instead of invalidating it
+            with self._recent_logs_lock:
+                if self._recent_logs_rows is not None:
+                    self._recent_logs_rows.extend(rows)
+                if self._log_row_count is not None:
+                    self._log_row_count += len(rows)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error saving {len(rows)} rows to persistent log: {e}")
+            return False
+
+    def _flush_worker(self):
+        """Drain queued log rows and flush them in batches."""
+        while True:
+            try:
+                rows = [self._log_queue.get()]
+                deadline = time.time() + self._flush_interval
+                while len(rows) < self._flush_batch_size:
+                    timeout = deadline - time.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        rows.append(self._log_queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                if self._append_rows(rows) and self._dropped_rows:
+                    # Backend is healthy again: record how many rows were shed
+                    # while the queue was full, then reset the counter.
+                    dropped, self._dropped_rows = self._dropped_rows, 0
+                    self._append_rows([[
+                        _now_str(), 'WARN', 'SYSTEM', 'Bot', 'LOG_DROP',
+                        f'{dropped} log entries dropped while queue was full',
+                        '', '', ''
+                    ]])
+            except Exception as e:
+                logger.error(f"❌ Persistent log flush worker error: {e}")
+                time.sleep(1)
+
+    def _flush_pending(self):
+        """Best-effort flush of queued rows at interpreter shutdown."""
+        rows = []
+        try:
+            while True:
+                rows.append(self._log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if rows:
+            self._append_rows(rows)
+
     def _setup_sheets_service(self):
         """Setup Google Sheets service for logging"""
         try:
-            creds = None
-            # GCP Project ID from environment (Cloud Run / Secret Manager path)
-            project_id = os.getenv('GCP_PROJECT_ID')
-            if project_id:
-                credentials_json = get_secret(project_id, 'google-credentials-json')
-                if credentials_json:
-                    logger.info("Using persistent logging credentials from Secret Manager")
-                    credentials_data = json.loads(credentials_json)
-                    creds = Credentials.from_service_account_info(
-                        credentials_data,
-                        scopes=['https://www.googleapis.com/auth/spreadsheets']
-                    )
-
-            # VPS/local fallback path
-            if not creds:
-                creds = build_sheets_credentials_from_env()
-            if not creds:
+            self.service = get_shared_sheets_service()
+            if self.service:
+                logger.info("✅ Persistent logger connected to Google Sheets")
+            else:
                 logger.warning("⚠️ No Google credentials available for persistent logging.")
-                self.service = None
-                return
-            
-            # Disable discovery cache to avoid noisy logs in server environments
-            self.service = build('sheets', 'v4', credentials=creds, cache_discovery=False)
-            logger.info("✅ Persistent logger connected to Google Sheets")
-            
-        except json.JSONDecodeError:
-            logger.warning("⚠️ Invalid JSON in 'google-credentials-json' secret")
-            self.service = None
         except Exception as e:
             logger.warning(f"⚠️ Could not setup persistent logging: {e}")
             self.service = None
@@ -384,12 +661,15 @@ class PersistentLogger:
     def log_to_sheets(self, timestamp: str, level: str, user_id: str, username: str, 
                      action: str, details: str, chat_type: str = "", 
                      client_number: str = "", success: str = ""):
-        """Save log entry permanently to Google Sheets"""
+        """Queue a log entry for permanent storage in Google Sheets.
+
+        Rows are flushed by the background worker in batches, so this never
+        blocks the caller on a Sheets HTTP round trip.
+        """
         if not self.service or not self.logs_sheet_id:
             return False
-        
+
         try:
-            # Prepare data row
             row_data = [
                 timestamp,
                 level,
@@ -401,29 +681,30 @@ class PersistentLogger:
                 client_number,
                 success
             ]
-            
-            # Insert into sheet
-            self.service.spreadsheets().values().append(
-                spreadsheetId=self.logs_sheet_id,
-                range='Sheet1!A:I',
-                valueInputOption='RAW',
-                insertDataOption='INSERT_ROWS',
-                body={'values': [row_data]}
-            ).execute()
-            
+            try:
+                self._log_queue.put_nowait(row_data)
+            except queue.Full:
+                self._dropped_rows += 1
+                return False
+            # Keep the running /stats counters in step with what was written.
+            # Pre-seed events are picked up by the sheet scan instead.
+            if self._stats_seeded:
+                today = date.today().strftime('%Y-%m-%d')
+                with self._stats_lock:
+                    self._roll_stats_day_locked(today)
+                    self._count_log_row_locked(row_data, today)
             return True
-            
         except Exception as e:
-            logger.error(f"❌ Error saving to persistent log: {e}")
+            logger.error(f"❌ Error queueing persistent log: {e}")
             return False
 
     def log_to_sheets_async(self, *args, **kwargs):
-        # Fire-and-forget wrapper to avoid blocking handlers
+        # Kept for call-site compatibility: log_to_sheets only enqueues now,
+        # so no per-call thread is needed to stay off the event loop.
         try:
-            t = threading.Thread(target=self.log_to_sheets, args=args, kwargs=kwargs, daemon=True)
-            t.start()
+            self.log_to_sheets(*args, **kwargs)
         except Exception:
-            logger.debug('Failed to start persistent logging thread')
+            logger.debug('Failed to enqueue persistent log entry')
     
     def get_recent_logs(self, limit: int = 50) -> List[List[str]]:
         """Get recent logs from Google Sheets"""
@@ -431,96 +712,115 @@ class PersistentLogger:
             return []
         
         try:
+            with self._recent_logs_lock:
+                if (
+                    self._recent_logs_rows is not None
+                    and len(self._recent_logs_rows) >= limit
+                    and (time.time() - self._recent_logs_ts) < self._recent_logs_ttl
+                ):
+                    rows = self._recent_logs_rows
+                    return rows[-limit:] if len(rows) > limit else list(rows)
+                total = self._log_row_count
+
+            if total is None:
+                # One narrow read of the key column to learn the sheet length
+                result = self.service.spreadsheets().values().get(
+                    spreadsheetId=self.logs_sheet_id,
+                    range='Sheet1!A:A',
+                    majorDimension='COLUMNS'
+                ).execute()
+                cols = result.get('values', [])
+                total = len(cols[0]) if cols else 0
+                with self._recent_logs_lock:
+                    self._log_row_count = total
+
+            if total <= 1:  # Only headers or empty
+                return []
+
+            # Fetch just the tail instead of the whole history; keep a bit
+            # more than asked so nearby calls with the same limit hit the memo.
+            start = max(2, total - max(limit, 50) + 1)
             result = self.service.spreadsheets().values().get(
                 spreadsheetId=self.logs_sheet_id,
-                range='Sheet1!A:I'
+                range=f'Sheet1!A{start}:I{total}'
             ).execute()
-            
-            values = result.get('values', [])
-            if len(values) <= 1:  # Only headers or empty
-                return []
-            
-            # Return last N entries (excluding header)
-            data_rows = values[1:]  # Skip header
-            return data_rows[-limit:] if len(data_rows) > limit else data_rows
+            data_rows = result.get('values', [])
+            with self._recent_logs_lock:
+                self._recent_logs_rows = data_rows
+                self._recent_logs_ts = time.time()
+            return data_rows[-limit:] if len(data_rows) > limit else list(data_rows)
             
         except Exception as e:
             logger.error(f"❌ Error al leer logs persistentes: {e}")
             return []
     
     def get_stats_from_logs(self) -> Dict[str, Any]:
-        """Get usage statistics from persistent logs"""
+        """Get usage statistics from the running counters.
+
+        The log sheet is scanned once to seed the counters; afterwards every
+        /stats call is a dict snapshot instead of an O(total_logs) download.
+        """
         if not self.service or not self.logs_sheet_id:
             return {}
-        
+
         try:
-            # Get today's date
+            if not self._stats_seeded:
+                self._seed_stats_from_sheet()
+
             today = date.today().strftime('%Y-%m-%d')
-            
-            # Get all logs
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.logs_sheet_id,
-                range='Sheet1!A:I'
-            ).execute()
-            
-            values = result.get('values', [])
-            if len(values) <= 1:
-                return {'total_logs': 0, 'today_logs': 0}
-            
-            data_rows = values[1:]  # Skip header
-            today_logs = []
-            search_logs = []
-            users_today = set()
-            groups_today = set()
-            
-            for row in data_rows:
-                if len(row) >= 5:  # Minimum required columns
-                    timestamp = row[0]
-                    action = row[4] if len(row) > 4 else ""
-                    user_id = row[2] if len(row) > 2 else ""
-                    chat_type = row[6] if len(row) > 6 else ""
-                    
-                    # Count today's activity
-                    if today in timestamp:
-                        today_logs.append(row)
-                        if user_id:
-                            users_today.add(user_id)
-                        if "Group" in chat_type:
-                            groups_today.add(chat_type)
-                    
-                    # Count searches
-                    if "SEARCH" in action:
-                        search_logs.append(row)
-            
-            successful_searches = len([log for log in search_logs if len(log) > 8 and log[8] == "SUCCESS"])
-            failed_searches = len([log for log in search_logs if len(log) > 8 and log[8] == "FAILURE"])
-            
-            return {
-                'total_logs': len(data_rows),
-                'today_logs': len(today_logs),
-                'total_searches': len(search_logs),
-                'successful_searches': successful_searches,
-                'failed_searches': failed_searches,
-                'unique_users_today': len(users_today),
-                'active_groups_today': len(groups_today)
-            }
-            
+            with self._stats_lock:
+                self._roll_stats_day_locked(today)
+                return {
+                    'total_logs': self._stats['total_logs'],
+                    'today_logs': self._stats['today_logs'],
+                    'total_searches': self._stats['total_searches'],
+                    'successful_searches': self._stats['successful_searches'],
+                    'failed_searches': self._stats['failed_searches'],
+                    'unique_users_today': len(self._stats['users_today']),
+                    'active_groups_today': len(self._stats['groups_today'])
+                }
         except Exception as e:
             logger.error(f"❌ Error getting stats from persistent logs: {e}")
             return {}
 
 class EnhancedUserActivityLogger:
     """Enhanced logger with persistent storage"""
-    
+
+    # Memo of "Group (<title>)" labels keyed by chat id; titles rarely change,
+    # so busy groups reuse one string instead of allocating it per update.
+    _chat_type_cache: Dict[int, Tuple[str, str]] = {}
+    _CHAT_TYPE_CACHE_MAX = 1024
+
+    @staticmethod
+    def _chat_type_label(chat) -> str:
+        if getattr(chat, 'type', None) == Chat.PRIVATE:
+            return "Private"
+        chat_id = getattr(chat, 'id', None)
+        title = getattr(chat, 'title', '') or ''
+        cache = EnhancedUserActivityLogger._chat_type_cache
+        if chat_id is not None:
+            cached = cache.get(chat_id)
+            if cached and cached[0] == title:
+                return cached[1]
+        label = f"Group ({title})"
+        if chat_id is not None:
+            if len(cache) >= EnhancedUserActivityLogger._CHAT_TYPE_CACHE_MAX:
+                cache.pop(next(iter(cache)))
+            cache[chat_id] = (title, label)
+        return label
+
     @staticmethod
-    def log_user_action(update: Update, action: str, details: str = "", client_number: str = "", success: str = ""):
-        """Log user actions with local AND persistent storage"""
+    def log_user_action(update: Update, action: str, details: str = "", client_number: str = "", success: str = "", timestamp: Optional[str] = None):
+        """Log user actions with local AND persistent storage.
+
+        Callers that already formatted a timestamp for their own output can
+        pass it through to avoid a second strftime per request.
+        """
         user = getattr(update, 'effective_user', None)
         chat = getattr(update, 'effective_chat', None)
-        timestamp = datetime.now(MEXICO_CITY_TZ).strftime('%Y-%m-%d %H:%M:%S')
 
-        # Determine chat type safely
-        chat_type = "Private" if getattr(chat, 'type', None) == Chat.PRIVATE else f"Group ({getattr(chat, 'title', '')})"
+        # Determine chat type safely (memoized per chat)
+        chat_type = EnhancedUserActivityLogger._chat_type_label(chat)
 
         # Safe user fields
         uname = getattr(user, 'username', None) or 'NoUsername'
@@ -528,27 +828,30 @@ class EnhancedUserActivityLogger:
         last = getattr(user, 'last_name', '')
         uid = getattr(user, 'id', 'unknown')
 
-        # Create log message for local logging
-        log_msg = (
-            f"USER: @{uname} ({first} {last or ''}) | ID: {uid} | CHAT: {chat_type} | ACTION: {action}"
-        )
+        # Local log line: skip all the string assembly when INFO is filtered
+        if logger.isEnabledFor(logging.INFO):
+            log_msg = (
+                f"USER: @{uname} ({first} {last or ''}) | ID: {uid} | CHAT: {chat_type} | ACTION: {action}"
+            )
 
-        if details:
-            log_msg += f" | DETAILS: {details}"
+            if details:
+                log_msg += f" | DETAILS: {details}"
 
-        if client_number:
-            log_msg += f" | CLIENT: {client_number}"
+            if client_number:
+                log_msg += f" | CLIENT: {client_number}"
 
-        if success:
-            log_msg += f" | RESULT: {success}"
+            if success:
+                log_msg += f" | RESULT: {success}"
 
-        # Log locally
-        logger.info(log_msg)
+            logger.info(log_msg)
 
         # Log persistently to Google Sheets (safe user fields)
+        plogger = get_persistent_logger()
+        if not plogger.enabled:
+            return
         try:
-            persistent_logger.log_to_sheets(
-                timestamp=timestamp,
+            plogger.log_to_sheets(
+                timestamp=timestamp or _now_str(),
                 level="INFO",
                 user_id=str(uid),
                 username=f"@{uname} ({first})",
@@ -564,14 +867,15 @@ class EnhancedUserActivityLogger:
     @staticmethod
     def log_system_event(event: str, details: str = ""):
         """Log system events (startup, errors, etc.)"""
-        timestamp = datetime.now(MEXICO_CITY_TZ).strftime('%Y-%m-%d %H:%M:%S')
-        
         # Log locally
-        logger.info(f"SYSTEM EVENT: {event} | {details}")
-        
+        logger.info("SYSTEM EVENT: %s | %s", event, details)
+
         # Log persistently
-        persistent_logger.log_to_sheets(
-            timestamp=timestamp,
+        plogger = get_persistent_logger()
+        if not plogger.enabled:
+            return
+        plogger.log_to_sheets(
+            timestamp=_now_str(),
             level="SYSTEM",
             user_id="SYSTEM",
             username="Bot System",
@@ -580,8 +884,20 @@ class EnhancedUserActivityLogger:
             chat_type="System"
         )
 
-# Initialize persistent logger
-persistent_logger = PersistentLogger()
+# Lazily-initialized persistent logger singleton. Building it eagerly at
+# import time pays the Secret Manager fetch + discovery build before the
+# process can do anything else; first use is soon enough.
+_persistent_logger: Optional[PersistentLogger] = None
+_persistent_logger_lock = threading.Lock()
+
+
+def get_persistent_logger() -> PersistentLogger:
+    global _persistent_logger
+    if _persistent_logger is None:
+        with _persistent_logger_lock:
+            if _persistent_logger is None:
+                _persistent_logger = PersistentLogger()
+    return _persistent_logger
 
 class GoogleSheetsManager:
     def __init__(self):
@@ -624,8 +940,16 @@ class GoogleSheetsManager:
 
         # Lightweight index: phone -> {sheet_id, sheet_name, row_num}
         self.index_phone_to_row: Dict[str, Dict[str, Any]] = {}
+        # Secondary index keyed by the trailing digits so numbers stored with a
+        # country code still resolve in O(1) instead of an O(N) endswith scan
+        self.index_suffix_to_row: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.suffix_digits = int(os.getenv('SUFFIX_MATCH_DIGITS', '10'))
         self.index_timestamp = 0
         self.index_ttl = int(os.getenv('INDEX_TTL_SECONDS', '600'))  # default 10 minutes
+        # Memoized sheet info (total clients/headers) to avoid an A:A fetch per /info or /status
+        self._sheet_info_cache: Optional[Dict[str, Any]] = None
+        self._sheet_info_ts: float = 0.0
+        self._sheet_info_ttl = int(os.getenv('SHEET_INFO_TTL_SECONDS', '60'))
         # Row cache (LRU) to avoid re-reading frequently used rows across sheets
         self.row_cache: OrderedDict[Tuple[str, str, int], Dict[str, str]] = OrderedDict()
         # Default row cache reduced for small-memory Cloud Run instances (512Mi)
@@ -645,6 +969,8 @@ class GoogleSheetsManager:
         self._index_warming = False
         # Executor for background blocking IO tasks
         self._executor = ThreadPoolExecutor(max_workers=int(os.getenv('SHEETS_THREAD_WORKERS', '4')))
+        # In-flight async lookups keyed by client number (event-loop only)
+        self._inflight: Dict[str, asyncio.Future] = {}
         # Start background refresher thread to keep index warm
         self._start_index_refresher()
         if self.service:
@@ -676,6 +1002,20 @@ class GoogleSheetsManager:
         )
         return any(token in message for token in retryable_tokens)
 
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Backoff for the given attempt, honoring Retry-After on 429s."""
+        if isinstance(error, HttpError):
+            try:
+                retry_after = getattr(error, 'resp', {}).get('retry-after')
+                if retry_after:
+                    return float(retry_after)
+            except Exception:
+                pass
+        delay = self.sheets_retry_base_delay * (2 ** (attempt - 1))
+        # Jitter spreads retries from concurrent workers so they don't
+        # re-hit the quota window in lockstep.
+        return delay + random.uniform(0, delay / 2)
+
     def _execute_with_retry(self, request, operation_name: str):
         attempts = max(1, self.sheets_retry_attempts)
         last_error = None
@@ -686,7 +1026,7 @@ class GoogleSheetsManager:
                 last_error = e
                 if not self._is_retryable_error(e) or attempt == attempts:
                     raise
-                delay = self.sheets_retry_base_delay * (2 ** (attempt - 1))
+                delay = self._retry_delay(e, attempt)
                 logger.warning(
                     f"⚠️ {operation_name} failed (attempt {attempt}/{attempts}): {e}. Retrying in {delay:.1f}s"
                 )
@@ -820,10 +1160,11 @@ class GoogleSheetsManager:
         if not values:
             return None
 
-        row = values[0]
-        client_data = {}
-        for i, hdr in enumerate(headers):
-            client_data[hdr] = row[i].strip() if i < len(row) and row[i] is not None else ''
+        # Strip each cell once, pad to header width, then zip straight into the dict
+        cells = [c.strip() if c is not None else '' for c in values[0]]
+        if len(cells) < len(headers):
+            cells.extend([''] * (len(headers) - len(cells)))
+        client_data = dict(zip(headers, cells))
 
         with self._row_cache_lock:
             self.row_cache[cache_key] = client_data
@@ -878,28 +1219,11 @@ class GoogleSheetsManager:
     
     def _authenticate(self):
         try:
-            creds = None
-            project_id = os.getenv('GCP_PROJECT_ID')
-            if project_id:
-                credentials_json = get_secret(project_id, 'google-credentials-json')
-                if credentials_json:
-                    logger.info("Using Google Sheets credentials from Secret Manager")
-                    credentials_data = json.loads(credentials_json)
-                    creds = Credentials.from_service_account_info(
-                        credentials_data,
-                        scopes=['https://www.googleapis.com/auth/spreadsheets']
-                    )
-
-            # VPS/local fallback path
-            if not creds:
-                creds = build_sheets_credentials_from_env()
-            if not creds:
+            self.service = get_shared_sheets_service()
+            if not self.service:
                 raise ValueError(
                     "❌ Could not load Google Sheets credentials from Secret Manager or local environment."
                 )
-            
-            # Disable discovery cache to avoid noisy logs in server environments
-            self.service = build('sheets', 'v4', credentials=creds, cache_discovery=False)
             logger.info("✅ Google Sheets connected successfully")
         except Exception as e:
             logger.error(f"❌ Failed to authenticate with Google Sheets: {e}")
@@ -921,9 +1245,8 @@ class GoogleSheetsManager:
             self.headers = result.get('values', [[]])[0]
             
             # Look for client number column
-            client_keywords = ['client', 'number', 'id', 'code']
             for i, header in enumerate(self.headers):
-                if any(keyword in header.lower().strip() for keyword in client_keywords):
+                if _CLIENT_COL_RE.search(header):
                     self.client_column = i
                     logger.info(f"📋 Client column found: '{header}' at position {i}")
                     return
@@ -936,9 +1259,8 @@ class GoogleSheetsManager:
     def _find_client_column_in_headers(self, headers: List[str]) -> int:
         if not headers:
             return 0
-        client_keywords = ['client', 'number', 'id', 'code']
         for i, header in enumerate(headers):
-            if any(keyword in header.lower().strip() for keyword in client_keywords):
+            if _CLIENT_COL_RE.search(header):
                 return i
         return 0
 
@@ -946,9 +1268,21 @@ class GoogleSheetsManager:
         if not raw:
             return ""
         # Keep only digits, remove leading zeros optionally
-        digits = ''.join(ch for ch in str(raw) if ch.isdigit())
+        digits = _NON_DIGITS_RE.sub('', str(raw))
         return digits.lstrip('0') if digits else ''
 
+    def _build_suffix_map(self, index_map: Dict[str, Dict[str, Any]]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """Derive the trailing-digits index from the full phone index.
+
+        Each entry keeps the full stored phone alongside the row ref so
+        lookups can verify the whole query matches, not just the suffix key.
+        """
+        suffix_map: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for phone, row_ref in index_map.items():
+            if len(phone) > self.suffix_digits:
+                suffix_map[phone[-self.suffix_digits:]] = (phone, row_ref)
+        return suffix_map
+
     def load_index(self):
         """Load an in-memory index mapping normalized phone -> row dict.
 
@@ -959,29 +1293,7 @@ class GoogleSheetsManager:
                 logger.warning("⚠️ Cannot load index: Sheets service or read sources missing")
                 return
 
-            # Read headers from the first sheet that returns a non-empty header row.
-            headers = []
-            header_sources = [(self.spreadsheet_id, self.primary_sheet_name)]
-            for src in self.read_sources:
-                if src not in header_sources:
-                    header_sources.append(src)
-
-            for sid, sheet_name in header_sources:
-                header_result = self._execute_with_retry(
-                    self.service.spreadsheets().values().get(
-                        spreadsheetId=sid,
-                        range=self._range_on_sheet(sheet_name, '1:1')
-                    ),
-                    f"read sheet headers for index ({self._source_label(sid, sheet_name)})"
-                ) or {}
-                headers = header_result.get('values', [[]])[0]
-                if headers:
-                    break
-            if not headers:
-                logger.warning("⚠️ No headers found when loading index")
-                return
-            self.headers = headers
-
+            # Check the disk cache before paying any network round trip.
             cache_path = self._index_cache_path()
             try:
                 if os.path.exists(cache_path):
@@ -1001,6 +1313,7 @@ class GoogleSheetsManager:
                                 }
                         with self._index_lock:
                             self.index_phone_to_row = normalized_cached
+                            self.index_suffix_to_row = self._build_suffix_map(normalized_cached)
                             self.index_timestamp = ts
                         logger.info(f"✅ Loaded lightweight index from cache with {len(self.index_phone_to_row)} entries")
                         return
@@ -1017,21 +1330,41 @@ class GoogleSheetsManager:
 
             # Build index across all configured sources (archives first, primary last).
             # This guarantees primary source values win on duplicate phone numbers.
+            # Header row and phone column are fetched in a single batchGet per
+            # source instead of two separate values().get round trips.
             search_order = list(self.read_sources)
 
             index_map: Dict[str, Dict[str, Any]] = {}
+            primary_headers: List[str] = []
+            fallback_headers: List[str] = []
             for sid, sheet_name in search_order:
                 try:
+                    # COLUMNS major dimension returns the phone column as one
+                    # flat list instead of a single-cell list per row. The
+                    # render option stays FORMATTED so numeric cells keep their
+                    # exact digits (unformatted values arrive as floats).
                     result = self._execute_with_retry(
-                        self.service.spreadsheets().values().get(
+                        self.service.spreadsheets().values().batchGet(
                             spreadsheetId=sid,
-                            range=self._range_on_sheet(sheet_name, f"{column_letter}2:{column_letter}")
+                            ranges=[
+                                self._range_on_sheet(sheet_name, '1:1'),
+                                self._range_on_sheet(sheet_name, f"{column_letter}2:{column_letter}")
+                            ],
+                            majorDimension='COLUMNS'
                         ),
-                        f"read phone column {column_letter} from {self._source_label(sid, sheet_name)}"
+                        f"batch read headers + phone column {column_letter} from {self._source_label(sid, sheet_name)}"
                     ) or {}
-                    phones = result.get('values', [])
-                    for i, row in enumerate(phones, start=2):
-                        raw_phone = row[0] if row and len(row) > 0 else ''
+                    value_ranges = result.get('valueRanges', [])
+                    header_cols = value_ranges[0].get('values', []) if value_ranges else []
+                    source_headers = [col[0] if col else '' for col in header_cols]
+                    if any(source_headers):
+                        if sid == self.spreadsheet_id and sheet_name == self.primary_sheet_name:
+                            primary_headers = source_headers
+                        elif not fallback_headers:
+                            fallback_headers = source_headers
+                    phone_cols = value_ranges[1].get('values', []) if len(value_ranges) > 1 else []
+                    phones = phone_cols[0] if phone_cols else []
+                    for i, raw_phone in enumerate(phones, start=2):
                         normalized = self._normalize_phone(raw_phone)
                         if normalized:
                             index_map[normalized] = {
@@ -1042,8 +1375,15 @@ class GoogleSheetsManager:
                 except Exception as e:
                     logger.warning(f"⚠️ Could not index source {self._source_label(sid, sheet_name)}: {e}")
 
+            headers = primary_headers or fallback_headers
+            if not headers:
+                logger.warning("⚠️ No headers found when loading index")
+                return
+            self.headers = headers
+
             with self._index_lock:
                 self.index_phone_to_row = index_map
+                self.index_suffix_to_row = self._build_suffix_map(index_map)
                 self.index_timestamp = time.time()
 
             try:
@@ -1106,22 +1446,28 @@ class GoogleSheetsManager:
             # Fallback: attempt suffix matching before rebuilding the index.
             # This helps when sheet stores numbers with country code or extra prefixes.
             try:
-                with self._index_lock:
-                    idx_copy = dict(self.index_phone_to_row)
-                if idx_copy:
-                    # find best suffix match (longest match)
-                    best_match_row_ref = None
-                    best_match_len = 0
+                if len(normalized) >= self.suffix_digits:
+                    # O(1) hit on the trailing-digits index
+                    with self._index_lock:
+                        entry = self.index_suffix_to_row.get(normalized[-self.suffix_digits:])
+                    if entry:
+                        stored_phone, row_ref = entry
+                        # A longer query must match the stored number in full;
+                        # a suffix collision alone is not the same client.
+                        if stored_phone.endswith(normalized):
+                            sheet_id, sheet_name, row_num = self._parse_row_ref(row_ref)
+                            if sheet_id and sheet_name and row_num:
+                                return self._fetch_row_client_data(sheet_id, sheet_name, row_num)
+                else:
+                    # Short queries cannot use the suffix index; single pass scan
+                    with self._index_lock:
+                        idx_copy = dict(self.index_phone_to_row)
                     for k, rn in idx_copy.items():
-                        if k.endswith(normalized) and len(normalized) <= len(k):
-                            match_len = len(normalized)
-                            if match_len > best_match_len:
-                                best_match_len = match_len
-                                best_match_row_ref = rn
-
-                    sheet_id, sheet_name, row_num = self._parse_row_ref(best_match_row_ref)
-                    if sheet_id and sheet_name and row_num:
-                        return self._fetch_row_client_data(sheet_id, sheet_name, row_num)
+                        if k.endswith(normalized):
+                            sheet_id, sheet_name, row_num = self._parse_row_ref(rn)
+                            if sheet_id and sheet_name and row_num:
+                                return self._fetch_row_client_data(sheet_id, sheet_name, row_num)
+                            break
             except Exception:
                 logger.debug("Suffix matching fallback failed; will rebuild index if needed")
 
@@ -1145,43 +1491,80 @@ class GoogleSheetsManager:
             return None
 
     async def get_client_data_async(self, client_number: str) -> Optional[Dict[str, str]]:
-        """Async wrapper that runs the blocking get_client_data in an executor."""
+        """Async wrapper that runs the blocking get_client_data in an executor.
+
+        Concurrent requests for the same number coalesce onto one in-flight
+        lookup: later callers await the first caller's future instead of
+        issuing their own Sheets fetch. The map is only touched from the
+        event loop, so no lock is needed.
+        """
+        existing = self._inflight.get(client_number)
+        if existing is not None:
+            return await existing
+
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._inflight[client_number] = fut
         try:
-            loop = asyncio.get_running_loop()
             # Use the manager's dedicated executor to avoid overloading the default
-            return await loop.run_in_executor(self._executor, self.get_client_data, client_number)
+            result = await loop.run_in_executor(self._executor, self.get_client_data, client_number)
+            if not fut.done():
+                fut.set_result(result)
+            return result
         except Exception as e:
             logger.error(f"❌ Async get_client_data error: {e}")
+            if not fut.done():
+                fut.set_result(None)
             return None
+        finally:
+            self._inflight.pop(client_number, None)
+            if not fut.done():
+                # A BaseException (e.g. CancelledError) unwound the first
+                # caller before the future was resolved. Resolve with None
+                # rather than cancelling: cancellation would propagate
+                # CancelledError into every coalesced waiter, killing their
+                # handlers too. None is the normal "lookup failed" answer.
+                fut.set_result(None)
     
     def get_sheet_info(self) -> Dict[str, Any]:
         try:
+            # Serve from memo while fresh; /info and /status call this on every use
+            if self._sheet_info_cache is not None and (time.time() - self._sheet_info_ts) < self._sheet_info_ttl:
+                return self._sheet_info_cache
+
             local_total = self.local_db.get_total_clients()
             if local_total:
-                return {
+                info = {
                     'total_clients': local_total,
                     'headers': self.headers,
                     'client_column': self.headers[self.client_column] if self.headers and self.client_column < len(self.headers) else 'Unknown'
                 }
+                self._sheet_info_cache = info
+                self._sheet_info_ts = time.time()
+                return info
             if not self.spreadsheet_id:
                 logger.warning("⚠️ SPREADSHEET_ID not set. Returning empty sheet info.")
                 return {'total_clients': 0, 'headers': [], 'client_column': 'Unknown'}
             if not self.service:
                 return {'total_clients': 0, 'headers': [], 'client_column': 'Unknown'}
             
+            # A2:A skips re-transferring the header row; the count is direct
             result = self.service.spreadsheets().values().get(
                 spreadsheetId=self.spreadsheet_id,
-                range=self._range_on_sheet(self.primary_sheet_name, 'A:A')
+                range=self._range_on_sheet(self.primary_sheet_name, 'A2:A')
             ).execute()
-            
+
             values = result.get('values', [])
-            total_rows = len(values) - 1
-            
-            return {
+            total_rows = len(values)
+
+            info = {
                 'total_clients': max(0, total_rows),
                 'headers': self.headers,
                 'client_column': self.headers[self.client_column] if self.headers and self.client_column < len(self.headers) else 'Unknown'
             }
+            self._sheet_info_cache = info
+            self._sheet_info_ts = time.time()
+            return info
         except Exception as e:
             logger.error(f"Error getting sheet info: {e}")
             return {'total_clients': 0, 'headers': [], 'client_column': 'Unknown'}
@@ -1330,10 +1713,11 @@ class GoogleSheetsManager:
 
                     batch_rows: List[Tuple[str, str, Dict[str, str], str, str, int]] = []
                     for row_num, row in enumerate(values, start=start_row):
-                        record: Dict[str, str] = {}
-                        for i, header in enumerate(headers):
-                            record[header] = row[i].strip() if i < len(row) and row[i] is not None else ''
-                        raw_phone = row[client_col].strip() if client_col < len(row) and row[client_col] is not None else ''
+                        cells = [c.strip() if c is not None else '' for c in row]
+                        if len(cells) < len(headers):
+                            cells.extend([''] * (len(headers) - len(cells)))
+                        record: Dict[str, str] = dict(zip(headers, cells))
+                        raw_phone = cells[client_col] if client_col < len(cells) else ''
                         normalized_phone = self._normalize_phone(raw_phone)
                         if normalized_phone:
                             batch_rows.append((normalized_phone, raw_phone, record, sid, sheet_name, row_num))
@@ -1387,12 +1771,17 @@ class TelegramBot:
             def _fallback_normalize(raw: str) -> str:
                 if not raw:
                     return ''
-                digits = ''.join(ch for ch in str(raw) if ch.isdigit())
+                digits = _NON_DIGITS_RE.sub('', str(raw))
                 return digits.lstrip('0') if digits else ''
 
             self._normalize_phone = _fallback_normalize
         self.application = None
         self.bot_info = None  # To cache bot info
+        # Derived bot-identity fields, computed once when bot_info is cached
+        self._bot_id: Optional[int] = None
+        self._bot_username_lower = ''
+        self._mention_tag = ''
+        self._mention_strip_re: Optional[re.Pattern] = None
         # In-memory deduplication store to avoid processing duplicate messages
         self.recent_messages: Dict[str, float] = {}
         self._recent_messages_lock = threading.Lock()
@@ -1400,6 +1789,16 @@ class TelegramBot:
         # Minimum length for a recognized client number (in digits)
         self.min_client_digits = int(os.getenv('MIN_CLIENT_NUMBER_LENGTH', '3'))
 
+        # Group direct-number mode settings, read once instead of per message
+        self.allow_direct_group = os.getenv('ALLOW_DIRECT_GROUP_NUMBER', 'true').lower() in ('1', 'true', 'yes')
+        self.min_group_direct_digits = int(os.getenv('MIN_GROUP_DIRECT_DIGITS', '10'))
+        self.max_group_direct_digits = int(os.getenv('MAX_GROUP_DIRECT_DIGITS', '15'))
+
+        # Authorized users parsed once into a frozenset; empty config means open access
+        raw_authorized = os.getenv('AUTHORIZED_USERS', '')
+        self._authorized_users = frozenset(x.strip() for x in raw_authorized.split(',') if x.strip())
+        self._auth_open = not self._authorized_users
+
         # Pending notifications to avoid duplicate follow-ups: (chat_id, client_number)
         self._pending_notifications = set()
 
@@ -1420,7 +1819,7 @@ class TelegramBot:
         # Fallback normalization
         if not raw:
             return ''
-        digits = ''.join(ch for ch in str(raw) if ch.isdigit())
+        digits = _NON_DIGITS_RE.sub('', str(raw))
         return digits.lstrip('0') if digits else ''
 
     def _get_normalize_fn(self):
@@ -1434,7 +1833,7 @@ class TelegramBot:
         def _local_fallback(raw: str) -> str:
             if not raw:
                 return ''
-            digits = ''.join(ch for ch in str(raw) if ch.isdigit())
+            digits = _NON_DIGITS_RE.sub('', str(raw))
             return digits.lstrip('0') if digits else ''
 
         return _local_fallback
@@ -1450,20 +1849,41 @@ class TelegramBot:
 
         text = raw_text.strip()
         # Only allow digits and common phone separators when using direct mode
-        if not re.fullmatch(r"[\d\s\-\(\)\+]+", text):
+        if not _DIRECT_NUMBER_RE.match(text):
             return False
 
-        digits = ''.join(ch for ch in text if ch.isdigit())
-        min_digits = int(os.getenv('MIN_GROUP_DIRECT_DIGITS', '10'))
-        max_digits = int(os.getenv('MAX_GROUP_DIRECT_DIGITS', '15'))
-        return min_digits <= len(digits) <= max_digits
+        digits = _NON_DIGITS_RE.sub('', text)
+        return self.min_group_direct_digits <= len(digits) <= self.max_group_direct_digits
+
+    async def _post_init(self, application: Application):
+        """Cache the bot identity once at startup.
+
+        Group handlers need the bot username for mention detection; fetching it
+        here means the first group message never pays a get_me() round trip.
+        """
+        try:
+            self._cache_bot_identity(await application.bot.get_me())
+            logger.info("🤖 Bot identity cached: @%s", getattr(self.bot_info, 'username', 'unknown'))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not prefetch bot info at startup: {e}")
+
+    def _cache_bot_identity(self, bot_info):
+        """Store bot info and precompute the mention tag and strip pattern."""
+        self.bot_info = bot_info
+        self._bot_id = getattr(bot_info, 'id', None)
+        self._bot_username_lower = (getattr(bot_info, 'username', '') or '').lower()
+        self._mention_tag = f"@{self._bot_username_lower}" if self._bot_username_lower else ''
+        self._mention_strip_re = (
+            re.compile(re.escape(self._mention_tag), re.IGNORECASE)
+            if self._mention_tag else None
+        )
 
     async def _ensure_bot_info(self, context: ContextTypes.DEFAULT_TYPE):
         """Ensure self.bot_info is populated (best-effort)."""
         if self.bot_info:
             return
         try:
-            self.bot_info = await context.bot.get_me()
+            self._cache_bot_identity(await context.bot.get_me())
         except Exception:
             logger.debug("Could not fetch bot info via get_me()")
 
@@ -1472,10 +1892,15 @@ class TelegramBot:
 
         Note: this requires `self.bot_info` to be set (username available).
         """
-        if not message or not self.bot_info or not getattr(self.bot_info, 'username', None):
+        if not message:
+            return False
+        if not getattr(self, '_mention_tag', '') and self.bot_info is not None:
+            # Derive the cached identity fields on demand when bot_info was
+            # assigned directly without going through _cache_bot_identity
+            # (e.g. instances built without __init__ in tests).
+            self._cache_bot_identity(self.bot_info)
+        if not getattr(self, '_mention_tag', ''):
             return False
-
-        bot_username = self.bot_info.username.lower()
 
         entities_sources = []
         if getattr(message, 'entities', None):
@@ -1489,18 +1914,26 @@ class TelegramBot:
                     if ent.type == 'mention':
                         start, end = ent.offset, ent.offset + ent.length
                         mention_text = text[start:end]
-                        if mention_text.lower() == f"@{bot_username}":
+                        if mention_text.lower() == self._mention_tag:
                             return True
                     if ent.type == 'text_mention':
                         mentioned_user = getattr(ent, 'user', None)
-                        if mentioned_user and self.bot_info and getattr(mentioned_user, 'id', None) == getattr(self.bot_info, 'id', None):
+                        bot_id = self._cached_bot_id()
+                        if mentioned_user and bot_id is not None and getattr(mentioned_user, 'id', None) == bot_id:
                             return True
             except Exception:
                 continue
 
         # Fallback: raw text contains @username
         raw = (message.text or message.caption or "").lower()
-        return f"@{bot_username}" in raw
+        return self._mention_tag in raw
+
+    def _cached_bot_id(self) -> Optional[int]:
+        """The bot's numeric id, falling back to bot_info when not cached."""
+        bot_id = getattr(self, '_bot_id', None)
+        if bot_id is None and self.bot_info is not None:
+            bot_id = getattr(self.bot_info, 'id', None)
+        return bot_id
 
     def _extract_client_number(self, text: str) -> str:
         if not text:
@@ -1532,15 +1965,17 @@ class TelegramBot:
             try:
                 if self._is_mentioned_in_message(message):
                     processed = (message.text or message.caption or "")
-                    if self.bot_info and getattr(self.bot_info, 'username', None):
-                        processed = re.sub(fr"@{re.escape(self.bot_info.username)}", "", processed, flags=re.IGNORECASE)
+                    strip_re = getattr(self, '_mention_strip_re', None)
+                    if strip_re is not None:
+                        processed = strip_re.sub("", processed)
                     return True, processed.strip()
             except Exception:
                 logger.debug("Mention detection failed")
 
             # Reply to a bot message
             try:
-                if message and getattr(message, 'reply_to_message', None) and getattr(message.reply_to_message, 'from_user', None) and self.bot_info and getattr(message.reply_to_message.from_user, 'id', None) == self.bot_info.id:
+                bot_id = self._cached_bot_id()
+                if message and getattr(message, 'reply_to_message', None) and getattr(message.reply_to_message, 'from_user', None) and bot_id is not None and getattr(message.reply_to_message.from_user, 'id', None) == bot_id:
                     raw_text = (message.text or message.caption or "")
                     return True, (raw_text or "").strip()
             except Exception:
@@ -1548,19 +1983,16 @@ class TelegramBot:
 
             # Optional direct-number mode for groups: if the whole message looks
             # like a client number, process it even without mention/reply.
-            try:
-                allow_direct_group = os.getenv('ALLOW_DIRECT_GROUP_NUMBER', 'true').lower() in ('1', 'true', 'yes')
-                raw_text = (message.text or message.caption or "").strip() if message is not None else ""
-                if allow_direct_group and self._is_direct_group_phone_candidate(raw_text):
-                    return True, raw_text
-            except Exception:
-                logger.debug("Direct-number detection in group failed")
+            # No try/except here: the check is pure attribute/regex work, and
+            # swallowing errors would hide misconfigured instances.
+            raw_text = (message.text or message.caption or "").strip() if message is not None else ""
+            if self.allow_direct_group and self._is_direct_group_phone_candidate(raw_text):
+                return True, raw_text
 
         return False, ""
     
     def _is_authorized_user(self, user_id: int) -> bool:
-        authorized_users = os.getenv('AUTHORIZED_USERS', '').split(',')
-        return str(user_id) in authorized_users if authorized_users != [''] else True
+        return self._auth_open or str(user_id) in self._authorized_users
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
@@ -1576,11 +2008,7 @@ class TelegramBot:
                     "Usa /help para ver todos los comandos."
                 )
             else:
-                msg = (
-                    f"👋 ¡Hola a todos! Soy <b>Client Data Bot</b>.\n\n"
-                    "Para buscar un cliente en este grupo, mencióname o responde a uno de mis mensajes.\n"
-                    "Ejemplo: @mi_bot_username 12345"
-                )
+                msg = START_GROUP_MESSAGE
             
             try:
                 await getattr(update, 'message', None).reply_text(msg, parse_mode='HTML')
@@ -1607,26 +2035,12 @@ class TelegramBot:
         # Log the action
         EnhancedUserActivityLogger.log_user_action(update, "HELP_COMMAND")
         
-        help_message = (
-            "📖 <b>Ayuda de Client Data Bot</b>\n\n"
-            "<b>Buscar clientes:</b>\n"
-            "• <b>En chat privado:</b> Simplemente envía el número de cliente.\n"
-            "• <b>En grupos:</b> Menciona al bot (ej. <code>@username_del_bot 12345</code>) o responde a un mensaje del bot con el número.\n\n"
-            "<b>Comandos disponibles:</b>\n"
-            "• <code>/start</code> - Mensaje de bienvenida.\n"
-            "• <code>/help</code> - Muestra esta ayuda.\n"
-            "• <code>/info</code> - Muestra información sobre la base de datos.\n"
-            "• <code>/status</code> - Verifica el estado del bot y la conexión.\n"
-            "• <code>/whoami</code> - Muestra tu información de Telegram.\n"
-            "• <code>/stats</code> - Muestra estadísticas de uso (autorizado).\n"
-            "• <code>/plogs</code> - Muestra los últimos logs de actividad (autorizado)."
-        )
         # Send help as HTML (static content already safe)
         try:
-            await update.message.reply_text(help_message, parse_mode='HTML')
+            await update.message.reply_text(HELP_MESSAGE, parse_mode='HTML')
         except Exception:
             try:
-                await context.bot.send_message(chat_id=getattr(update.effective_chat, 'id', None), text=help_message, parse_mode='HTML')
+                await context.bot.send_message(chat_id=getattr(update.effective_chat, 'id', None), text=HELP_MESSAGE, parse_mode='HTML')
             except Exception:
                 logger.debug('Failed to send help message')
     
@@ -1637,23 +2051,24 @@ class TelegramBot:
         
         info = self.sheet_info
         
-        message = (
+        parts = [
             "📋 <b>Spreadsheet Information:</b>\n\n"
             f"📊 <b>Total clients:</b> {safe_html(info.get('total_clients', '0'))}\n"
             f"🔍 <b>Search column:</b> {safe_html(info.get('client_column', 'Unknown'))}\n\n"
-            f"<b>Available fields:</b>\n"
-        )
-        
+            "<b>Available fields:</b>\n"
+        ]
+
         if info['headers']:
-            for i, header in enumerate(info['headers'][:10], 1):  # Show first 10 headers
-                message += f"• {safe_html(header)}\n"
-            
+            # Show first 10 headers
+            parts.extend(f"• {safe_html(header)}\n" for header in info['headers'][:10])
+
             if len(info['headers']) > 10:
-                message += f"• ... and {safe_html(str(len(info['headers']) - 10))} more fields\n"
+                parts.append(f"• ... and {safe_html(str(len(info['headers']) - 10))} more fields\n")
         else:
-            message += "• No headers found\n"
-        
-        message += f"\n💡 Send any client number to search!"
+            parts.append("• No headers found\n")
+
+        parts.append("\n💡 Send any client number to search!")
+        message = "".join(parts)
         try:
             await update.message.reply_text(message, parse_mode='HTML')
         except Exception:
@@ -1701,18 +2116,19 @@ class TelegramBot:
         # Log the action
         EnhancedUserActivityLogger.log_user_action(update, "STATUS_COMMAND")
 
+        test_info: Dict[str, Any] = {}
         try:
             # Test Google Sheets connection
-            test_info = self.sheets_manager.get_sheet_info()
+            test_info = await asyncio.to_thread(self.sheets_manager.get_sheet_info)
             sheets_status = "✅ Connected"
-        except:
+        except Exception:
             sheets_status = "❌ Disconnected"
 
         # Test persistent logging
         try:
-            persistent_logger.get_recent_logs(limit=1)
+            await asyncio.to_thread(get_persistent_logger().get_recent_logs, 1)
             logs_status = "✅ Working"
-        except:
+        except Exception:
             logs_status = "❌ Error"
 
         try:
@@ -1725,7 +2141,7 @@ class TelegramBot:
             f"🤖 <b>Bot:</b> ✅ Running\n"
             f"📊 <b>Google Sheets:</b> {safe_html(sheets_status)}\n"
             f"📝 <b>Persistent Logs:</b> {safe_html(logs_status)}\n"
-            f"📋 <b>Total clients:</b> {safe_html(str(self.sheet_info.get('total_clients', 'Unknown')))}\n\n"
+            f"📋 <b>Total clients:</b> {safe_html(str(test_info.get('total_clients') or self.sheet_info.get('total_clients', 'Unknown')))}\n\n"
             "🖥 <b>Servicios VPS:</b>\n"
             + "\n".join(vps_lines) +
             "\n\n🚀 <b>Ready to search!</b>"
@@ -1769,7 +2185,7 @@ class TelegramBot:
             await update.message.reply_text("⛔ No estás autorizado para ver las estadísticas.")
             return
         
-        stats = persistent_logger.get_stats_from_logs()
+        stats = await asyncio.to_thread(get_persistent_logger().get_stats_from_logs)
         if not stats:
             await update.message.reply_text("No hay estadísticas disponibles.")
             return
@@ -1802,15 +2218,21 @@ class TelegramBot:
             await update.message.reply_text("⛔ No estás autorizado para ver los logs persistentes.")
             return
         
-        logs = persistent_logger.get_recent_logs()
+        logs = await asyncio.to_thread(get_persistent_logger().get_recent_logs)
         if not logs:
             await update.message.reply_text("No se encontraron logs persistentes.")
             return
         
-        log_message = "📝 Últimos 20 Logs Persistentes:\n\n"
-        for entry in logs:
-            if isinstance(entry, list) and len(entry) >= 5:
-                log_message += f"{safe_html(entry[0])} | {safe_html(entry[1])} | {safe_html(entry[4])}\n"
+        # Join once instead of growing the string per entry; the whole block is
+        # escaped below, so entries are not pre-escaped here (that double-escaped
+        # HTML special chars before).
+        parts = ["📝 Últimos 20 Logs Persistentes:", ""]
+        parts.extend(
+            f"{entry[0]} | {entry[1]} | {entry[4]}"
+            for entry in logs
+            if isinstance(entry, list) and len(entry) >= 5
+        )
+        log_message = "\n".join(parts)
 
         # logs displayed as preformatted text — escape and wrap in <pre>
         safe_logs = '<pre>' + html_escape(log_message) + '</pre>'
@@ -1833,7 +2255,7 @@ class TelegramBot:
                 def _runtime_fallback(raw: str) -> str:
                     if not raw:
                         return ''
-                    digits = ''.join(ch for ch in str(raw) if ch.isdigit())
+                    digits = _NON_DIGITS_RE.sub('', str(raw))
                     return digits.lstrip('0') if digits else ''
                 self._normalize_phone = _runtime_fallback
 
@@ -1893,9 +2315,8 @@ class TelegramBot:
 
             if not client_number:
                 # Only reply if the bot was directly addressed but no number was found
-                bot_username = getattr(self.bot_info, 'username', '') if self.bot_info else ''
-                message_text = (message_to_process or raw_text or "")
-                if (chat and getattr(chat, 'type', None) == Chat.PRIVATE) or (bot_username and f"@{bot_username.lower()}" in message_text.lower()):
+                lowered_text = (message_to_process or raw_text or "").lower()
+                if (chat and getattr(chat, 'type', None) == Chat.PRIVATE) or (self._mention_tag and self._mention_tag in lowered_text):
                     try:
                         await update.message.reply_text(
                             "❌ Por favor, envía un número de cliente válido.",
@@ -1915,8 +2336,8 @@ class TelegramBot:
                 # Log successful search (user-facing persistent log)
                 # Non-blocking persistent log
                 try:
-                    persistent_logger.log_to_sheets_async(
-                        timestamp=datetime.now(MEXICO_CITY_TZ).strftime('%Y-%m-%d %H:%M:%S'),
+                    get_persistent_logger().log_to_sheets_async(
+                        timestamp=_now_str(),
                         level="INFO",
                         user_id=str(getattr(user, 'id', 'unknown')),
                         username=f"@{getattr(user, 'username', '')}",
@@ -1930,19 +2351,12 @@ class TelegramBot:
                     logger.debug('Failed to enqueue persistent log')
                 
                 # Build an HTML-safe response with new format
-                field_mappings = {
-                    'client phone number': 'Número 📞',
-                    'cliente': 'Cliente 🙋🏻‍♀️',
-                    'correo': 'Correo ✉️',
-                    'other info': 'Otra Información ℹ️'
-                }
-
                 parts = []
                 parts.append("✅ <b>Cliente encontrado</b>")
                 parts.append("")
 
                 for key, value in client_data.items():
-                    display_key = field_mappings.get(key.lower().strip(), key.strip())
+                    display_key = FIELD_MAPPINGS.get(key.lower().strip(), key.strip())
                     parts.append(f"{safe_html(display_key)}: {safe_html(value)}")
 
                 user_display = f"@{getattr(user, 'username', '')}" if getattr(user, 'username', None) else safe_html(getattr(user, 'first_name', ''))
@@ -2007,8 +2421,8 @@ class TelegramBot:
                     pass
                 # Log failed search async
                 try:
-                    persistent_logger.log_to_sheets_async(
-                        timestamp=datetime.now(MEXICO_CITY_TZ).strftime('%Y-%m-%d %H:%M:%S'),
+                    get_persistent_logger().log_to_sheets_async(
+                        timestamp=_now_str(),
                         level="INFO",
                         user_id=str(getattr(user, 'id', 'unknown')),
                         username=f"@{getattr(user, 'username', '')}",
@@ -2213,17 +2627,49 @@ class TelegramBot:
         self.application.add_handler(
             MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, self.handle_message)
         )
-        # 2. Group messages are routed through a single handler and then gated by
-        # _addressed_and_processed_text (mention/reply/direct-number mode).
+        # 2. Group messages: gate at the filter level so non-addressed traffic
+        # never schedules the handler coroutine. _addressed_and_processed_text
+        # still does the precise checks (reply-to-bot, digit-length bounds).
+        group_gate = (
+            filters.Entity(MessageEntity.MENTION)
+            | filters.Entity(MessageEntity.TEXT_MENTION)
+            | filters.REPLY
+        )
+        if self.allow_direct_group:
+            group_gate = group_gate | filters.Regex(_DIRECT_NUMBER_RE)
         self.application.add_handler(
-            MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS, self.handle_message)
+            MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.GROUPS & group_gate, self.handle_message)
         )
         
         logger.info("✅ All handlers setup complete")
     
     def run(self):
         try:
-            self.application = Application.builder().token(self.token).build()
+            # Split HTTP pools: a sized pool for outbound sends plus a
+            # dedicated single connection for getUpdates long polling, so a
+            # burst of replies can never starve the polling request.
+            builder = (
+                Application.builder()
+                .token(self.token)
+                .post_init(self._post_init)
+                # Process updates concurrently: handlers are I/O-bound
+                # (Sheets lookups), so one slow search must not serialize
+                # every other chat behind it.
+                .concurrent_updates(True)
+                .connection_pool_size(int(os.getenv('PTB_POOL_SIZE', '32')))
+                .pool_timeout(float(os.getenv('PTB_POOL_TIMEOUT', '20')))
+                .get_updates_connection_pool_size(1)
+                .get_updates_pool_timeout(60)
+            )
+            # Pace outbound sends below Telegram's per-chat/global limits so
+            # bursts never trigger 429 retry storms. Needs the rate-limiter
+            # extra (aiolimiter); skip gracefully if it isn't installed.
+            try:
+                from telegram.ext import AIORateLimiter
+                builder = builder.rate_limiter(AIORateLimiter(max_retries=3))
+            except ImportError:
+                logger.warning("⚠️ python-telegram-bot[rate-limiter] not installed; outbound sends unpaced")
+            self.application = builder.build()
             self.setup_handlers()
             
             # Log system startup early
@@ -2232,10 +2678,15 @@ class TelegramBot:
             logger.info("🚀 Starting bot with run_polling()...")
             logger.info("📊 Sheets connected: %s", "✅ Yes" if self.sheets_manager.service else "❌ No")
             logger.info("📋 Total clients: %s", self.sheet_info.get('total_clients', 'Unknown'))
-            logger.info("💾 Persistent logging: %s", "✅ Yes" if persistent_logger.service else "❌ No")
+            logger.info("💾 Persistent logging: %s", "✅ Yes" if get_persistent_logger().service else "❌ No")
             
-            # High-level API handles initialize/start/polling/idle/stop
-            self.application.run_polling(drop_pending_updates=True)
+            # High-level API handles initialize/start/polling/idle/stop.
+            # Only request the update types we register handlers for, so
+            # Telegram never delivers edits/channel posts we would discard.
+            self.application.run_polling(
+                drop_pending_updates=True,
+                allowed_updates=["message", "callback_query"]
+            )
             
         except KeyboardInterrupt:
             logger.info("🛑 Bot stopped by user")
@@ -2273,18 +2724,11 @@ class TelegramBot:
 
             if client_data:
                 # Build response same as in main handler
-                field_mappings = {
-                    'client phone number': 'Número 📞',
-                    'cliente': 'Cliente 🙋🏻‍♀️',
-                    'correo': 'Correo ✉️',
-                    'other info': 'Otra Información ℹ️'
-                }
-                
                 parts = []
                 parts.append("✅ <b>Cliente encontrado</b>")
                 parts.append("")
                 for key_name, value in client_data.items():
-                    display_key = field_mappings.get(key_name.lower().strip(), key_name.strip())
+                    display_key = FIELD_MAPPINGS.get(key_name.lower().strip(), key_name.strip())
                     parts.append(f"{safe_html(display_key)}: {safe_html(value)}")
                 response_html = "\n".join(parts)
 
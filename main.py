@@ -3,13 +3,14 @@
 Simple main.py for Cloud Run that runs the bot in the main thread
 """
 
+import json
 import os
 import logging
 import signal
 import sys
 import threading
 import time
-from flask import Flask, jsonify
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 # Setup logging first
 logging.basicConfig(
@@ -21,9 +22,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 logger.info("🚀 Starting main.py...")
 
-# Flask app for health checks
-app = Flask(__name__)
-
 # Global state
 bot_instance = None
 shutdown_requested = False
@@ -33,7 +31,7 @@ def signal_handler(signum, frame):
     global shutdown_requested
     logger.info(f"📨 Received signal {signum}, initiating shutdown...")
     shutdown_requested = True
-    
+
     if bot_instance and hasattr(bot_instance, 'application'):
         try:
             bot_instance.application.stop()
@@ -42,42 +40,67 @@ def signal_handler(signum, frame):
     # Do not call sys.exit here; allow main thread to exit naturally after cleanup.
     # Cloud Run will receive the process exit and handle restarts if needed.
 
-def run_flask_server():
-    """Run Flask server in background thread"""
-    port = int(os.environ.get("PORT", 8080))
-    logger.info(f"🌐 Starting Flask on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
-
-@app.route('/')
-def health_check():
-    """Simple health check"""
-    return "✅ Bot is running!" if bot_instance else "🔄 Bot is starting...", 200
-
-@app.route('/health')
-def detailed_health():
-    """Detailed health status"""
-    global bot_instance
-    
+def health_status():
+    """Detailed health status payload"""
     status = {
         "status": "running" if bot_instance else "starting",
         "bot_ready": bot_instance is not None,
         "timestamp": int(time.time())
     }
-    
+
     if bot_instance:
         try:
             status["sheets_connected"] = bool(
-                hasattr(bot_instance, 'sheets_manager') and 
-                bot_instance.sheets_manager and 
+                hasattr(bot_instance, 'sheets_manager') and
+                bot_instance.sheets_manager and
                 bot_instance.sheets_manager.service
             )
-            
+
             if hasattr(bot_instance, 'sheet_info'):
                 status["total_clients"] = bot_instance.sheet_info.get('total_clients', 0)
         except Exception as e:
             status["health_error"] = str(e)
-    
-    return jsonify(status), 200
+
+    return status
+
+class HealthRequestHandler(BaseHTTPRequestHandler):
+    """Minimal stdlib handler for Cloud Run health probes.
+
+    The update hot path never touches HTTP (the bot polls Telegram), so a
+    threaded stdlib server is all the process needs — no WSGI framework.
+    """
+
+    def do_GET(self):
+        if self.path == '/health':
+            body = json.dumps(health_status()).encode('utf-8')
+            content_type = 'application/json'
+        elif self.path == '/':
+            text = "✅ Bot is running!" if bot_instance else "🔄 Bot is starting..."
+            body = text.encode('utf-8')
+            content_type = 'text/plain; charset=utf-8'
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep per-probe request lines out of the application logs
+        pass
+
+def start_health_server() -> ThreadingHTTPServer:
+    """Bind the health server and serve it from a background thread"""
+    port = int(os.environ.get("PORT", 8080))
+    server = ThreadingHTTPServer(('0.0.0.0', port), HealthRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"🌐 Health server listening on port {port}")
+    return server
 
 def run_bot_once():
     """Initialize and run the bot one time in the main thread.
@@ -106,22 +129,33 @@ def run_bot_once():
         # Re-raise so the process exits and Cloud Run can restart the container.
         raise
 
+def install_uvloop():
+    """Use uvloop as the asyncio event loop when available.
+
+    Drop-in libuv loop; worthwhile for this socket-heavy workload
+    (TLS long-polling to Telegram plus Sheets calls). Optional: the bot
+    runs fine on the default loop if the wheel isn't installed.
+    """
+    try:
+        import uvloop
+        uvloop.install()
+        logger.info("⚡ uvloop installed as event loop policy")
+    except ImportError:
+        logger.info("ℹ️ uvloop not available, using default asyncio loop")
+
 def main():
     """Main entry point"""
     logger.info("🎬 Main function started")
-    
+
+    install_uvloop()
+
     # Register signal handlers
-    signal.signal(signal.SIGTERM, signal_handler)  
+    signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
-    
-    # Start Flask server in background
-    flask_thread = threading.Thread(target=run_flask_server, daemon=True)
-    flask_thread.start()
-    
-    # Give Flask time to start
-    time.sleep(2)
-    logger.info("✅ Flask health server started")
-    
+
+    # Bind the health endpoint before the bot starts so probes never race init
+    start_health_server()
+
     # Run bot in main thread (CRITICAL for asyncio)
     try:
         run_bot_once()
@@ -132,4 +166,4 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -77,7 +77,7 @@ def get_service():
     if not cred_path:
         raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS is not set")
     creds = service_account.Credentials.from_service_account_file(cred_path, scopes=SCOPES)
-    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+    return build("sheets", "v4", credentials=creds, cache_discovery=False, static_discovery=True)
 
 
 def range_on_sheet(sheet_name: str, cell_range: str) -> str:
@@ -47,6 +47,16 @@ class DummyService:
         return DummySheetsApi(self._values_api)
 
 
+class DummyLocalDb:
+    """SQLite cache stand-in: always misses, swallows writes."""
+
+    def get_client_record(self, normalized_phone):
+        return None
+
+    def upsert_client(self, **kwargs):
+        pass
+
+
 class DummyExecutor:
     def __init__(self):
         self.submit_calls = 0
@@ -68,7 +78,11 @@ def build_manager_for_tests(values_api):
     manager.headers = ["client phone number", "cliente", "correo", "banco"]
     manager.client_column = 0
     manager.spreadsheet_id = "sheet"
+    manager.primary_sheet_name = "Sheet1"
+    manager.local_db = DummyLocalDb()
     manager.index_phone_to_row = {}
+    manager.suffix_digits = 10
+    manager.index_suffix_to_row = {}
     manager.index_timestamp = time.time()
     manager.index_ttl = 1800
     manager.row_cache = {}
@@ -98,7 +112,7 @@ def test_execute_with_retry_recovers_from_broken_pipe():
 def test_suffix_fallback_returns_row_data_without_rebuild():
     values = DummyValuesApi(
         {
-            "Sheet1!A123:D123": DummyRequest(
+            "'Sheet1'!A123:D123": DummyRequest(
                 payload={
                     "values": [["5215536604547", "MORALES", "", ""]]
                 }
@@ -107,6 +121,7 @@ def test_suffix_fallback_returns_row_data_without_rebuild():
     )
     manager = build_manager_for_tests(values)
     manager.index_phone_to_row = {"5215536604547": 123}
+    manager.index_suffix_to_row = manager._build_suffix_map(manager.index_phone_to_row)
 
     data = manager.get_client_data("5536604547")
 
@@ -40,6 +40,10 @@ def build_test_bot():
     tb = TelegramBot.__new__(TelegramBot)
     tb.bot_info = None
     tb.min_client_digits = 3
+    # Mirror the env-derived attributes normally set in __init__
+    tb.allow_direct_group = os.getenv('ALLOW_DIRECT_GROUP_NUMBER', 'true').lower() in ('1', 'true', 'yes')
+    tb.min_group_direct_digits = int(os.getenv('MIN_GROUP_DIRECT_DIGITS', '10'))
+    tb.max_group_direct_digits = int(os.getenv('MAX_GROUP_DIRECT_DIGITS', '15'))
     tb._normalize_phone = lambda raw: ''.join(ch for ch in str(raw) if ch.isdigit()).lstrip('0')
     tb._get_normalize_fn = lambda: tb._normalize_phone
     return tb